@@ -1,34 +1,71 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, BackgroundTasks, status
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, ForeignKey, Text
-from sqlalchemy.orm import declarative_base, sessionmaker, Session, relationship
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, Index, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, relationship
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Literal
+import asyncio
+import hashlib
+import multiprocessing
+import time
 import uuid
 import os
+import orjson
 
-from backend.services.cleaner import load_and_clean
-from backend.services.analyzer import analyze_dataframe
-from backend.services.report import generate_pdf_report
+from backend.services.pipeline import build_report, process_upload
 
 # ─── Config ────────────────────────────────────────────────────────────────
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-production-use-a-long-random-string")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+REPORT_PENDING_TIMEOUT = 15 * 60  # seconds before a .pending marker counts as stale
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bad.db")
+
+# Cleaning, analysis and PDF rendering are CPU-bound and mostly hold the GIL,
+# so they run in worker processes. spawn keeps workers from inheriting the
+# server's threads and locks
+def _new_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+
+EXECUTOR = _new_executor()
+
+
+async def _run_in_worker(fn, *args):
+    """Run fn(*args) in the worker pool, replacing the pool if a worker died."""
+    global EXECUTOR
+    executor = EXECUTOR
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        # A killed worker (e.g. OOM on a huge upload) breaks the pool for good.
+        # Fail the affected jobs but give later ones a fresh pool; only the
+        # first caller to notice swaps it. No retry: the same job would
+        # likely kill the new pool too
+        if EXECUTOR is executor:
+            EXECUTOR = _new_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./bad.db")
 
 # ─── Database ──────────────────────────────────────────────────────────────
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async driver + pooled connections: DB I/O no longer blocks the event loop
+engine = create_async_engine(DATABASE_URL)
+# expire_on_commit=False so attributes stay readable after commit without a lazy reload
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -55,20 +92,18 @@ class UploadedFile(Base):
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     user = relationship("User", back_populates="files")
 
-
-Base.metadata.create_all(bind=engine)
+    # History lists a user's newest uploads; serve it from the index instead of a sort
+    __table_args__ = (Index("ix_uf_user_created", "user_id", "created_at"),)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # ─── Auth helpers ──────────────────────────────────────────────────────────
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# New hashes use argon2; existing bcrypt hashes still verify and are upgraded on login
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 
@@ -76,8 +111,9 @@ def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+def verify_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses a deprecated scheme."""
+    return pwd_context.verify_and_update(plain, hashed)
 
 
 def create_access_token(data: dict) -> str:
@@ -87,7 +123,7 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User | None:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User | None:
     """Returns user if token is valid, None if no token (allows anonymous uploads)."""
     if not token:
         return None
@@ -98,7 +134,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             return None
     except JWTError:
         return None
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.get(User, user_id)
 
 
 def require_user(current_user: User | None = Depends(get_current_user)) -> User:
@@ -143,7 +179,16 @@ class FileHistoryItem(BaseModel):
 
 
 # ─── App ──────────────────────────────────────────────────────────────────
-app = FastAPI(title="BAD — Basic Analysis of Data")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await engine.dispose()
+    EXECUTOR.shutdown(cancel_futures=True)
+
+
+app = FastAPI(title="BAD — Basic Analysis of Data", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -166,26 +211,34 @@ def health():
 
 # ─── Auth Routes ──────────────────────────────────────────────────────────
 @app.post("/auth/register", response_model=TokenResponse)
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == req.email).first():
+async def register(req: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    if await db.scalar(select(User).where(User.email == req.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
     user = User(
         email=req.email,
         name=req.name,
-        hashed_password=hash_password(req.password),
+        hashed_password=await run_in_threadpool(hash_password, req.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     token = create_access_token({"sub": user.id})
     return TokenResponse(access_token=token)
 
 
 @app.post("/auth/login", response_model=TokenResponse)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form.username).first()
-    if not user or not verify_password(form.password, user.hashed_password):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == form.username))
+    # Hashing is CPU-bound; keep it off the event loop
+    if user:
+        valid, new_hash = await run_in_threadpool(verify_password, form.password, user.hashed_password)
+    else:
+        valid, new_hash = False, None
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     token = create_access_token({"sub": user.id})
     return TokenResponse(access_token=token)
 
@@ -196,11 +249,52 @@ def me(current_user: User = Depends(require_user)):
 
 
 # ─── Upload ───────────────────────────────────────────────────────────────
+def _save_upload(src, dest: Path) -> str:
+    """Copy the spooled upload to dest and return its content digest."""
+    # The whole copy runs in one worker call instead of two event-loop hops
+    # per chunk; chunks stay fixed-size so memory stays flat for big uploads.
+    # The digest lets repeat uploads reuse the cleaned result
+    h = hashlib.blake2b(digest_size=16)
+    with open(dest, "wb") as f:
+        while chunk := src.read(UPLOAD_CHUNK_SIZE):
+            h.update(chunk)
+            f.write(chunk)
+    return h.hexdigest()
+
+
+def _pending_marker(pdf_path: Path) -> Path:
+    return pdf_path.with_name(f"{pdf_path.name}.pending")
+
+
+def _report_pending(pdf_path: Path) -> bool:
+    # A crash or restart mid-render leaves the marker behind; past the timeout
+    # it is dropped so clients get a 404 instead of polling forever
+    marker = _pending_marker(pdf_path)
+    try:
+        age = time.time() - marker.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    if age > REPORT_PENDING_TIMEOUT:
+        marker.unlink(missing_ok=True)
+        return False
+    return True
+
+
+async def _build_report(source_path: Path, insights: list, pdf_path: Path, filename: str):
+    """Render the PDF report after the upload response has gone out."""
+    try:
+        await _run_in_worker(build_report, source_path, insights, pdf_path, filename)
+    finally:
+        _pending_marker(pdf_path).unlink(missing_ok=True)
+
+
 @app.post("/upload")
 async def upload(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    output_format: Literal["parquet", "xlsx"] = Query("parquet", alias="format"),
     current_user: User | None = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
@@ -212,48 +306,41 @@ async def upload(
     uid = uuid.uuid4().hex
     input_path = DATA_DIR / f"{uid}_{file.filename}"
 
-    with open(input_path, "wb") as f:
-        f.write(await file.read())
+    digest = await run_in_threadpool(_save_upload, file.file, input_path)
 
     try:
-        df = load_and_clean(input_path)
-        insights = analyze_dataframe(df)
-        preview = df.head(10).fillna("").to_dict(orient="records")
-
-        excel_path = DATA_DIR / f"{uid}_cleaned.xlsx"
-        df.to_excel(excel_path, index=False)
-
-        pdf_path = DATA_DIR / f"{uid}_report.pdf"
-        generate_pdf_report(df, insights, pdf_path, meta={"filename": file.filename})
+        # pandas/pyarrow work is CPU-bound; run it in a worker process
+        result, report_source = await _run_in_worker(
+            process_upload, input_path, DATA_DIR, uid, digest, file.filename, output_format
+        )
 
         # Save to DB if user is authenticated
         if current_user:
-            import json
             record = UploadedFile(
                 user_id=current_user.id,
                 filename=file.filename,
-                rows=int(df.shape[0]),
-                cols=int(df.shape[1]),
-                cleaned_path=f"/download/{excel_path.name}",
-                report_path=f"/download/{pdf_path.name}",
-                columns_json=json.dumps(insights),
+                rows=result["rows"],
+                cols=result["cols"],
+                cleaned_path=result["cleanedFile"],
+                report_path=result["reportPdf"],
+                columns_json=orjson.dumps(result["columns"]).decode(),
             )
             db.add(record)
-            db.commit()
-            db.refresh(record)
+            await db.commit()
+            await db.refresh(record)
             file_id = record.id
         else:
             file_id = uid
 
-        return {
-            "id": file_id,
-            "rows": int(df.shape[0]),
-            "cols": int(df.shape[1]),
-            "preview": preview,
-            "columns": insights,
-            "cleanedFile": f"/download/{excel_path.name}",
-            "reportPdf": f"/download/{pdf_path.name}",
-        }
+        # The PDF is the slowest step and the client doesn't need it to show
+        # results, so render it after responding; /download answers 202 until
+        # the marker is gone
+        if report_source is not None:
+            pdf_path = DATA_DIR / Path(result["reportPdf"]).name
+            _pending_marker(pdf_path).touch()
+            background_tasks.add_task(_build_report, report_source, result["columns"], pdf_path, file.filename)
+
+        return {"id": file_id, **result}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -268,20 +355,27 @@ async def upload(
 
 # ─── File History ─────────────────────────────────────────────────────────
 @app.get("/files/history")
-def file_history(
+async def file_history(
     current_user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    import json
-    records = (
-        db.query(UploadedFile)
-        .filter(UploadedFile.user_id == current_user.id)
+    rows = await db.execute(
+        select(
+            UploadedFile.id,
+            UploadedFile.filename,
+            UploadedFile.rows,
+            UploadedFile.cols,
+            UploadedFile.cleaned_path,
+            UploadedFile.report_path,
+            UploadedFile.created_at,
+            UploadedFile.columns_json,
+        )
+        .where(UploadedFile.user_id == current_user.id)
         .order_by(UploadedFile.created_at.desc())
         .limit(20)
-        .all()
     )
     result = []
-    for r in records:
+    for r in rows:
         item = {
             "id": r.id,
             "filename": r.filename,
@@ -293,7 +387,7 @@ def file_history(
         }
         if r.columns_json:
             try:
-                item["columns"] = json.loads(r.columns_json)
+                item["columns"] = orjson.loads(r.columns_json)
             except Exception:
                 item["columns"] = []
         result.append(item)
@@ -301,33 +395,35 @@ def file_history(
 
 
 @app.delete("/files/{file_id}")
-def delete_file(
+async def delete_file(
     file_id: str,
     current_user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    record = db.query(UploadedFile).filter(
+    record = await db.scalar(select(UploadedFile).where(
         UploadedFile.id == file_id,
         UploadedFile.user_id == current_user.id
-    ).first()
+    ))
     if not record:
         raise HTTPException(status_code=404, detail="File not found")
-    db.delete(record)
-    db.commit()
+    await db.delete(record)
+    await db.commit()
     return {"ok": True}
 
 
 # ─── Download ─────────────────────────────────────────────────────────────
-@app.get("/download/{filename}")
+@app.api_route("/download/{filename}", methods=["GET", "HEAD"])
 def download(filename: str):
     # Prevent path traversal
     if ".." in filename or "/" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
     file_path = DATA_DIR / filename
     if not file_path.exists():
+        if _report_pending(file_path):
+            return JSONResponse(
+                {"detail": "Report is still being generated"},
+                status_code=202,
+                headers={"Retry-After": "1"},
+            )
         raise HTTPException(status_code=404, detail="File not found")
-    return StreamingResponse(
-        open(file_path, "rb"),
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
\ No newline at end of file
+    return FileResponse(file_path, media_type="application/octet-stream", filename=filename)
\ No newline at end of file
@@ -1,28 +1,125 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from pandas.api.types import is_numeric_dtype
 
+TOP_N = 5
+
+
+def _to_float(value):
+    return None if pd.isna(value) else float(value)
+
+
+def _is_numeric(s: pd.Series) -> bool:
+    # is_numeric_dtype is True for np.bool_ but False for bool[pyarrow]; count
+    # both as numeric so CSV (Arrow) and xlsx (NumPy) uploads agree
+    dtype = s.dtype
+    if isinstance(dtype, pd.ArrowDtype) and pa.types.is_boolean(dtype.pyarrow_dtype):
+        return True
+    return is_numeric_dtype(dtype)
+
+
+def _is_arrow_backed(s: pd.Series) -> bool:
+    return isinstance(s.dtype, pd.ArrowDtype) or getattr(s.dtype, "storage", None) == "pyarrow"
+
+
+def _arrow_values(s: pd.Series):
+    # Goes through the extension array's __arrow_array__, which hands back the
+    # column's Arrow data without a copy. pa.chunked_array(s) would need the
+    # Arrow C stream on Series, which only pandas 3 provides
+    return pa.array(s.array)
+
+
+def _missing_counts(df: pd.DataFrame) -> dict:
+    # Arrow arrays carry their null count, so those columns need no scan; only
+    # NumPy-backed columns go through isna(), without building a full mask frame
+    return {
+        col: _arrow_values(s).null_count if _is_arrow_backed(s) else int(s.isna().sum())
+        for col, s in df.items()
+    }
+
+
+def _numeric_stats(df: pd.DataFrame, numeric_cols: list) -> dict:
+    # Arrow-backed columns use the fused min_max kernel (one pass for both) plus
+    # mean, which beats pandas' three separate reductions on them. NumPy-backed
+    # columns are faster through one frame-wide pandas aggregate
+    stats = {}
+    numpy_cols = []
+    for col in numeric_cols:
+        s = df[col]
+        if not _is_arrow_backed(s):
+            numpy_cols.append(col)
+            continue
+        arr = _arrow_values(s)
+        mm = pc.min_max(arr)
+        mean = pc.mean(arr).as_py()
+        if mean is not None and np.isnan(mean):
+            # Arrow's mean doesn't skip NaN (only nulls); let pandas handle it
+            numpy_cols.append(col)
+            continue
+        stats[col] = (mm["min"].as_py(), mm["max"].as_py(), mean)
+
+    if numpy_cols:
+        frame = df[numpy_cols]
+        # Cleaning may narrow floats to float32, and pandas would then sum the
+        # mean in float32 too; widen first so the mean accumulates in float64
+        frame = frame.astype({c: "float64" for c in numpy_cols if frame[c].dtype == np.float32})
+        agg = frame.agg(["min", "max", "mean"])
+        for col in numpy_cols:
+            stats[col] = (agg.at["min", col], agg.at["max", col], agg.at["mean", col])
+    return stats
+
+
+def top_values(s: pd.Series, n: int = TOP_N):
+    # String columns go through Arrow's hash-based value_counts kernel, with no
+    # per-value str() cast. Anything else (datetimes, mixed objects Arrow can't
+    # type) keeps the pandas path, whose str() rendering the output relies on
+    try:
+        arr = pa.array(s, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        arr = None
+
+    if arr is not None and pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    if arr is None or not (pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type)):
+        vc = s.dropna().astype(str).value_counts().head(n)
+        return [{"value": k, "count": int(v)} for k, v in vc.items()]
+
+    vc = pc.value_counts(arr.drop_null())
+    counts = vc.field("counts").to_numpy()
+    # Stable sort keeps first-seen order among ties, matching pandas
+    top = np.argsort(-counts, kind="stable")[:n]
+    values = vc.field("values").take(pa.array(top)).to_pylist()
+    return [{"value": v, "count": int(counts[i])} for v, i in zip(values, top)]
+
+
 def analyze_dataframe(df: pd.DataFrame):
     insights = []
 
+    # Frame-wide passes for NA counts and min/max/mean, instead of a dropna +
+    # three reductions per column
+    missing = _missing_counts(df)
+    numeric_cols = [col for col in df.columns if _is_numeric(df[col])]
+    stats = _numeric_stats(df, numeric_cols)
+
     for col in df.columns:
         s = df[col]
         info = {
             "column": str(col),
             "dtype": str(s.dtype),
-            "missing": int(s.isna().sum()),
+            "missing": int(missing[col]),
         }
 
-        if is_numeric_dtype(s):
-            non_null = s.dropna()
+        if col in stats:
+            mn, mx, mean = stats[col]
             info["kind"] = "numeric"
-            info["min"] = float(non_null.min()) if not non_null.empty else None
-            info["max"] = float(non_null.max()) if not non_null.empty else None
-            info["mean"] = float(non_null.mean()) if not non_null.empty else None
+            info["min"] = _to_float(mn)
+            info["max"] = _to_float(mx)
+            info["mean"] = _to_float(mean)
         else:
             info["kind"] = "text"
-            # show top values
-            vc = s.dropna().astype(str).value_counts().head(5)
-            info["top_values"] = [{"value": k, "count": int(v)} for k, v in vc.items()]
+            info["top_values"] = top_values(s)
 
         insights.append(info)
 
@@ -1,37 +1,184 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import is_float_dtype, is_integer_dtype, is_string_dtype
 from pathlib import Path
 
+# Below this many rows the nunique scan costs more than category saves
+CATEGORY_MIN_ROWS = 10_000
+
+
+def _read_csv(path: Path):
+    # Multi-threaded Arrow parser with Arrow-backed columns. Arrow only
+    # decodes UTF-8 and keeps undecodable text as binary, and it leaves
+    # duplicate headers as-is where the default parser renames them (a, a.1),
+    # so those files go through the default parser and its encoding fallbacks
+    try:
+        df = pd.read_csv(path, engine="pyarrow", dtype_backend="pyarrow")
+        if not df.columns.has_duplicates and not any(
+            isinstance(dtype, pd.ArrowDtype) and pa.types.is_binary(dtype.pyarrow_dtype)
+            for dtype in df.dtypes
+        ):
+            return df
+    except ValueError:
+        pass
+
+    try:
+        return pd.read_csv(path, encoding='utf-8')
+    except UnicodeDecodeError:
+        try:
+            return pd.read_csv(path, encoding='latin-1')
+        except UnicodeDecodeError:
+            return pd.read_csv(path, encoding='cp1252')
+
+
+def _read_excel(path: Path):
+    # calamine is a Rust reader that parses the sheet without building
+    # openpyxl's cell object model. If python-calamine isn't installed or it
+    # can't handle the workbook, fall back to openpyxl
+    try:
+        return pd.read_excel(path, engine="calamine")
+    except Exception:
+        return pd.read_excel(path, engine="openpyxl")
+
+
+def _is_text(s: pd.Series) -> bool:
+    return s.dtype == "object" or is_string_dtype(s.dtype)
+
+
+def _categorize_text(df: pd.DataFrame):
+    # Text columns where most values repeat (status, country, ...) become
+    # category: int codes plus one dictionary, so dedup and value counts work
+    # on small ints instead of hashing every string
+    if len(df) < CATEGORY_MIN_ROWS:
+        return df
+    for col in [c for c in df.columns if _is_text(df[c])]:
+        s = df[col]
+        if s.nunique(dropna=True) * 2 < len(s):
+            df[col] = s.astype("category")
+    return df
+
+
+def _downcast_numeric(df: pd.DataFrame):
+    # Shrink numeric columns to the smallest dtype that holds them. Integers
+    # always fit exactly; float32 only replaces float64 when every value
+    # round-trips, since otherwise reported min/max/mean would drift
+    for col in df.columns:
+        s = df[col]
+        if is_integer_dtype(s.dtype):
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif is_float_dtype(s.dtype):
+            down = pd.to_numeric(s, downcast="float")
+            if down.dtype != s.dtype and down.astype(s.dtype).equals(s):
+                df[col] = down
+    return df
+
+
+def _stringify_mixed(df: pd.DataFrame):
+    # Parquet needs one type per column; object columns Arrow can't type (e.g.
+    # ints mixed with strings, common in xlsx) are written as their str() values
+    mixed = []
+    for col in df.columns:
+        if df[col].dtype != "object":
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            mixed.append(col)
+    if not mixed:
+        return df
+    df = df.copy(deep=False)
+    for col in mixed:
+        df[col] = df[col].map(str, na_action="ignore")
+    return df
+
+
 def load_and_clean(path: Path):
     path = Path(path)
     name = path.name.lower()
 
     # Load
     if name.endswith(".csv"):
-        try:
-            df = pd.read_csv(path, encoding='utf-8')
-        except UnicodeDecodeError:
-            try:
-                df = pd.read_csv(path, encoding='latin-1')
-            except UnicodeDecodeError:
-                df = pd.read_csv(path, encoding='cp1252')
+        df = _read_csv(path)
     elif name.endswith(".xlsx"):
-        df = pd.read_excel(path)
+        df = _read_excel(path)
     else:
         raise ValueError("Unsupported file type. Upload .csv or .xlsx")
 
     # Clean basics
-    df = df.copy()
     df.columns = [str(c).strip() for c in df.columns]
 
-    # Trim strings safely
-    for col in df.columns:
-        if df[col].dtype == "object":
-            df[col] = df[col].astype(str).str.strip()
+    # Trim strings safely. .str.strip() runs Arrow's utf8_trim_whitespace on
+    # Arrow-backed columns and leaves missing values missing; in object columns
+    # it yields NaN for non-string cells, so those keep their original value
+    for col in [c for c in df.columns if _is_text(df[c])]:
+        s = df[col]
+        stripped = s.str.strip()
+        if s.dtype == "object":
+            stripped = stripped.where(stripped.notna(), s)
+        df[col] = stripped
+
+    df = _categorize_text(df)
+
+    # Drop fully empty rows, then duplicates among what's left; the result gets
+    # a fresh RangeIndex rather than carrying the original row labels
+    df = df.dropna(how="all").drop_duplicates(ignore_index=True)
+
+    return _downcast_numeric(df)
+
+
+def _is_tz_aware(dtype) -> bool:
+    if isinstance(dtype, pd.ArrowDtype):
+        return pa.types.is_timestamp(dtype.pyarrow_dtype) and dtype.pyarrow_dtype.tz is not None
+    return isinstance(dtype, pd.DatetimeTZDtype)
 
-    # Drop fully empty rows
-    df = df.dropna(how="all")
 
-    # Drop duplicates
-    df = df.drop_duplicates()
+def _drop_timezones(df: pd.DataFrame):
+    # Excel has no timezone support, and the Arrow CSV parser types offset
+    # timestamps ("...Z") as tz-aware; write them as naive UTC wall times
+    tz_cols = [c for c in df.columns if _is_tz_aware(df[c].dtype)]
+    if not tz_cols:
+        return df
+    df = df.copy(deep=False)
+    for col in tz_cols:
+        df[col] = df[col].dt.tz_convert("UTC").dt.tz_localize(None)
+    return df
 
-    return df
\ No newline at end of file
+
+def load_cleaned(path: Path):
+    table = pq.read_table(path)
+    df = table.to_pandas()
+    # pandas reads ArrowDtype strings back as its own StringDtype and may
+    # infer str for object columns; restore the dtypes recorded at write time
+    # so a cache hit reports the same dtypes as a fresh load
+    for meta in (table.schema.pandas_metadata or {}).get("columns", []):
+        col, numpy_type = meta["name"], meta["numpy_type"]
+        if col not in df.columns:
+            continue
+        if numpy_type == "string[pyarrow]":
+            df[col] = df[col].astype(pd.ArrowDtype(pa.string()))
+        elif numpy_type == "object" and df[col].dtype != "object":
+            df[col] = df[col].astype(object)
+    return df
+
+
+def save_cleaned(df: pd.DataFrame, path: Path, strict: bool = False):
+    path = Path(path)
+    name = path.name.lower()
+
+    if name.endswith(".parquet"):
+        try:
+            df.to_parquet(path, engine="pyarrow", compression="zstd", index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Parquet can't hold mixed-type columns; write them as text unless
+            # the caller asked for the Arrow error instead
+            if strict:
+                raise
+            _stringify_mixed(df).to_parquet(path, engine="pyarrow", compression="zstd", index=False)
+    elif name.endswith(".xlsx"):
+        # xlsxwriter is C-accelerated and much faster than openpyxl. Its
+        # constant_memory mode needs row-by-row writes, but pandas emits cells
+        # column by column, so it isn't usable here
+        _drop_timezones(df).to_excel(path, index=False, engine="xlsxwriter")
+    else:
+        raise ValueError("Unsupported output type. Use .parquet or .xlsx")
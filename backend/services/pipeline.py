@@ -0,0 +1,127 @@
+from pathlib import Path
+import os
+import shutil
+import time
+
+from backend.services.cleaner import load_and_clean, load_cleaned, save_cleaned
+from backend.services.analyzer import analyze_dataframe
+from backend.services.report import generate_pdf_report
+
+# Entry points here run in worker processes: they take and return only
+# picklable values and never touch the web app or the database
+
+# Cleaned frames are cached by upload digest under DATA_DIR/cache, keeping the
+# most recently used entries. Entries used within CACHE_MIN_AGE seconds are
+# never evicted, since a deferred report job may still be about to read them
+CACHE_MAX_ENTRIES = 64
+CACHE_MIN_AGE = 10 * 60
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _evict_cache(cache_dir: Path):
+    entries = sorted(cache_dir.glob("*.parquet"), key=_mtime, reverse=True)
+    cutoff = time.time() - CACHE_MIN_AGE
+    for path in entries[CACHE_MAX_ENTRIES:]:
+        if _mtime(path) < cutoff:
+            path.unlink(missing_ok=True)
+
+
+def _load_and_clean_cached(input_path: Path, data_dir: Path, uid: str, digest: str):
+    """Return (df, cache_path); cache_path is None when the frame couldn't be cached."""
+    cache_dir = data_dir / "cache"
+    cache_dir.mkdir(exist_ok=True)
+    cache_path = cache_dir / f"{digest}.parquet"
+    try:
+        # Bump mtime first: it is the LRU clock eviction goes by
+        os.utime(cache_path)
+        return load_cleaned(cache_path), cache_path
+    except FileNotFoundError:
+        pass
+
+    df = load_and_clean(input_path)
+    # Write under a unique name and rename into place, so a concurrent upload of
+    # the same file never reads a half-written cache entry
+    tmp_path = data_dir / f"{uid}_cache.parquet"
+    try:
+        # Strict, so a mixed-type frame stays uncached rather than coming back
+        # from the cache with its values turned into text
+        save_cleaned(df, tmp_path, strict=True)
+        tmp_path.replace(cache_path)
+    except Exception:
+        # Caching is best-effort; the upload itself can still go ahead
+        tmp_path.unlink(missing_ok=True)
+        return df, None
+    _evict_cache(cache_dir)
+    return df, cache_path
+
+
+def _link_or_copy(src: Path, dest: Path):
+    # Downloads get their own name so cache eviction never breaks old links; a
+    # hard link shares the bytes, with a copy where links aren't supported
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def _render_report(df, insights: list, pdf_path: Path, filename: str):
+    # Render to a temp name and rename, so /download never serves a partial PDF
+    tmp_path = pdf_path.with_name(f"{pdf_path.name}.part")
+    try:
+        generate_pdf_report(df, insights, tmp_path, meta={"filename": filename})
+        tmp_path.replace(pdf_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def process_upload(
+    input_path: Path,
+    data_dir: Path,
+    uid: str,
+    digest: str,
+    filename: str,
+    output_format: str = "parquet",
+):
+    """Clean and analyse an uploaded file and write the cleaned data.
+
+    Returns (result, report_source). report_source is the Parquet file to build
+    the PDF from later via build_report; when the frame couldn't be cached it is
+    None and the report has already been rendered here.
+    """
+    df, cache_path = _load_and_clean_cached(input_path, data_dir, uid, digest)
+    insights = analyze_dataframe(df)
+    # where() rather than fillna(""): on an object frame pandas 2.2 warns that
+    # fillna's silent downcasting is deprecated
+    head = df.head(10).astype(object)
+    preview = head.where(head.notna(), "").to_dict(orient="records")
+
+    cleaned_path = data_dir / f"{uid}_cleaned.{output_format}"
+    if output_format == "parquet" and cache_path is not None:
+        # The cache entry is already the cleaned Parquet file
+        _link_or_copy(cache_path, cleaned_path)
+    else:
+        save_cleaned(df, cleaned_path)
+
+    pdf_path = data_dir / f"{uid}_report.pdf"
+    if cache_path is None:
+        _render_report(df, insights, pdf_path, filename)
+
+    return {
+        "rows": int(df.shape[0]),
+        "cols": int(df.shape[1]),
+        "preview": preview,
+        "columns": insights,
+        "cleanedFile": f"/download/{cleaned_path.name}",
+        "reportPdf": f"/download/{pdf_path.name}",
+    }, cache_path
+
+
+def build_report(source_path: Path, insights: list, pdf_path: Path, filename: str):
+    """Render the PDF report from the cleaned Parquet file written by process_upload."""
+    _render_report(load_cleaned(source_path), insights, pdf_path, filename)
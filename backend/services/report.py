@@ -8,10 +8,17 @@ from pathlib import Path
 from datetime import datetime
 import tempfile
 
+import pandas as pd
+
+from backend.services.analyzer import top_values
+
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+# pyplot keeps global "current figure" state, so reports must not be built
+# from several threads of one process; the app renders them in worker
+# processes, each running one report at a time
 
 # ---------- Chart helpers ----------
 def _save_histogram(series, out_path: Path, title: str):
@@ -24,8 +31,8 @@ def _save_histogram(series, out_path: Path, title: str):
 
 
 def _save_top_values_bar(series, out_path: Path, title: str):
-    s = series.dropna().astype(str)
-    vc = s.value_counts().head(8)
+    # Same Arrow-backed counting the analyzer uses, rather than a str cast per cell
+    vc = pd.Series({tv["value"]: tv["count"] for tv in top_values(series, n=8)}, dtype="int64")
     plt.figure()
     vc.plot(kind="bar")
     plt.title(title)
@@ -140,7 +147,9 @@ def _draw_charts(c: canvas.Canvas, df, insights):
             img_path = tmpdir / f"chart_{charts_made}.png"
 
             try:
-                if kind == "numeric":
+                # Booleans count as numeric in the analysis, but a histogram of
+                # two values says less than their counts
+                if kind == "numeric" and not pd.api.types.is_bool_dtype(df[col_name].dtype):
                     _save_histogram(df[col_name], img_path, f"{col_name} (Histogram)")
                 else:
                     _save_top_values_bar(df[col_name], img_path, f"{col_name} (Top Values)")
@@ -314,11 +314,33 @@ function Dashboard() {
   const [history, setHistory] = useState([]);
   const [dragOver, setDragOver] = useState(false);
   const [activeTab, setActiveTab] = useState("overview");
+  const [reportStatus, setReportStatus] = useState("pending"); // pending | ready | failed
 
   const fileMeta = useMemo(() => file ? { name: file.name, sizeMB: bytesToMB(file.size) } : null, [file]);
 
   useEffect(() => { fetchHistory(); }, []);
 
+  // The PDF is rendered after the upload responds; poll until it stops answering 202
+  useEffect(() => {
+    setReportStatus("pending");
+    if (!result?.reportPdf) return;
+    let cancelled = false;
+    let timer;
+    async function poll() {
+      let status;
+      try {
+        status = (await fetch(`${API_URL}${result.reportPdf}`, { method: "HEAD" })).status;
+      } catch {}
+      if (cancelled) return;
+      // 202 = still rendering; network errors are retried too
+      if (status === 202 || status === undefined) timer = setTimeout(poll, 1000);
+      else setReportStatus(status === 200 ? "ready" : "failed");
+    }
+    poll();
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [result?.reportPdf]);
+  const reportReady = reportStatus === "ready";
+
   async function fetchHistory() {
     if (!token) return;
     try {
@@ -342,7 +364,7 @@ function Dashboard() {
     try {
       const form = new FormData();
       form.append("file", f);
-      const res = await fetch(`${API_URL}/upload`, {
+      const res = await fetch(`${API_URL}/upload?format=xlsx`, {
         method: "POST",
         headers: token ? { Authorization: `Bearer ${token}` } : {},
         body: form,
@@ -427,12 +449,13 @@ function Dashboard() {
                     <div className="text-zinc-500 text-xs">.xlsx output</div>
                   </div>
                 </a>
-                <a href={`${API_URL}${result.reportPdf}`} target="_blank" rel="noreferrer"
-                  className="flex items-center gap-3 p-3 bg-zinc-800 hover:bg-zinc-700/80 rounded-xl transition-colors group">
+                <a href={reportReady ? `${API_URL}${result.reportPdf}` : undefined} target="_blank" rel="noreferrer"
+                  aria-disabled={!reportReady}
+                  className={`flex items-center gap-3 p-3 bg-zinc-800 rounded-xl transition-colors group ${reportReady ? "hover:bg-zinc-700/80" : reportStatus === "failed" ? "opacity-60 cursor-not-allowed" : "opacity-60 cursor-wait"}`}>
                   <span className="text-lg">📄</span>
                   <div>
                     <div className="text-white text-xs font-medium group-hover:text-indigo-300 transition-colors">PDF Report</div>
-                    <div className="text-zinc-500 text-xs">Charts + summary</div>
+                    <div className="text-zinc-500 text-xs">{reportReady ? "Charts + summary" : reportStatus === "failed" ? "Report unavailable" : "Generating…"}</div>
                   </div>
                 </a>
               </div>